@@ -1,6 +1,14 @@
+import os
+
 from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
 
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .recipepdf import FONT_PATH, register_fonts
+        if os.path.exists(FONT_PATH):
+            register_fonts()
@@ -0,0 +1,269 @@
+import os
+from bisect import bisect_left
+from glob import glob
+from hashlib import md5
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from foodgram.settings import (CATALOG_CHECK_INTERVAL, RECIPE_CACHE_TIMEOUT,
+                               SHOPPING_LIST_CACHE_DIR,
+                               SHOPPING_LIST_CACHE_SIZE)
+from recipes.models import Cart, Ingredient, Tag, Version
+from .search import TrigramIndex, fold_name
+
+
+def recipe_cache_key(pk, updated_at, request, tags_version):
+    """
+    Ключ кэша представления рецепта. Меняется при каждом сохранении
+    рецепта (updated_at) и версии справочника тегов, из которого
+    берутся теги, и зависит от адреса, по которому строятся
+    ссылки на изображения.
+    """
+    host = f'{request.scheme}://{request.get_host()}' if request else ''
+    return f'recipe:{pk}:{updated_at.timestamp()}:{tags_version}:{host}'
+
+
+def get_cached_representations(recipes, keys, build_many, overlay):
+    """
+    Представления рецептов страницы одним запросом к кэшу.
+    Промахи строятся одним вызовом build_many и сохраняются,
+    у попаданий зависящие от пользователя поля обновляются через overlay.
+    """
+    cached = cache.get_many(keys)
+    missing = [
+        (recipe, key) for recipe, key in zip(recipes, keys)
+        if key not in cached
+    ]
+    built = {}
+    if missing:
+        built = dict(zip(
+            [key for _, key in missing],
+            build_many([recipe for recipe, _ in missing]),
+        ))
+        cache.set_many(built, RECIPE_CACHE_TIMEOUT)
+    return [
+        built[key] if key in built else overlay(cached[key], recipe)
+        for recipe, key in zip(recipes, keys)
+    ]
+
+
+class CatalogSnapshot:
+    def __init__(self, version, updated_at, items):
+        self.version = version
+        self.updated_at = updated_at
+        self.items = items
+        self.by_id = {item['id']: item for item in items}
+        self.positions = {
+            item['id']: position for position, item in enumerate(items)
+        }
+
+
+class IngredientSnapshot(CatalogSnapshot):
+    """Снимок справочника ингредиентов с индексом по префиксу названия."""
+
+    def __init__(self, version, updated_at, items):
+        super().__init__(version, updated_at, items)
+        index = sorted(
+            (fold_name(item['name']), position)
+            for position, item in enumerate(items)
+        )
+        self.keys = [key for key, _ in index]
+        self.key_positions = [position for _, position in index]
+
+    @cached_property
+    def trigram_index(self):
+        return TrigramIndex(item['name'] for item in self.items)
+
+    def search_prefix(self, query):
+        prefix = fold_name(query)
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + chr(0x10FFFF), lo=start)
+        return [
+            self.items[position]
+            for position in self.key_positions[start:end]
+        ]
+
+
+class VersionedCatalog:
+    """
+    Справочник, закэшированный в памяти процесса.
+    Счетчик в Version проверяется не чаще раза в CATALOG_CHECK_INTERVAL
+    секунд; при его изменении справочник перечитывается, поэтому все
+    воркеры видят изменения без общего кэша.
+    """
+    version_key = None
+    snapshot_class = CatalogSnapshot
+
+    def __init__(self):
+        self.snapshot = None
+        self.checked_at = None
+        self.lock = Lock()
+
+    def load(self):
+        raise NotImplementedError
+
+    def invalidate(self):
+        self.checked_at = None
+
+    def get(self, version=None):
+        """
+        version — уже прочитанная запись Version справочника: снимок
+        сверяется с ней без запроса и без ожидания интервала проверки.
+        """
+        if version is None:
+            snapshot = self.snapshot
+            checked_at = self.checked_at
+            if (
+                snapshot is not None and checked_at is not None
+                and monotonic() - checked_at < CATALOG_CHECK_INTERVAL
+            ):
+                return snapshot
+            version = Version.get_many(self.version_key).get(
+                self.version_key,
+            )
+        value, updated_at = (
+            (version.value, version.updated_at) if version else (0, None)
+        )
+        with self.lock:
+            if self.snapshot is None or self.snapshot.version != value:
+                self.snapshot = self.snapshot_class(
+                    value, updated_at, self.load(),
+                )
+            self.checked_at = monotonic()
+            return self.snapshot
+
+
+class TagCatalog(VersionedCatalog):
+    version_key = 'tags'
+
+    def load(self):
+        return list(
+            Tag.objects.order_by('name', 'pk').values(
+                'id', 'name', 'color', 'slug',
+            ),
+        )
+
+
+class IngredientCatalog(VersionedCatalog):
+    version_key = 'ingredients'
+    snapshot_class = IngredientSnapshot
+
+    def load(self):
+        return list(
+            Ingredient.objects.order_by('name', 'pk').values(
+                'id', 'name', 'measurement_unit',
+            ),
+        )
+
+
+tag_catalog = TagCatalog()
+ingredient_catalog = IngredientCatalog()
+
+
+class ShoppingListFileCache:
+    """
+    Готовые файлы списков покупок на диске вне MEDIA_ROOT: их отдает
+    только view списка покупок после проверки пользователя. Имя файла
+    состоит из id пользователя и отпечатка корзины: id рецептов
+    и их updated_at. Общий размер ограничен max_size, первыми удаляются
+    файлы, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, directory, max_size, suffix):
+        self.directory = directory
+        self.max_size = max_size
+        self.suffix = suffix
+
+    @staticmethod
+    def get_fingerprint(user):
+        recipes = Cart.objects.filter(user=user).order_by(
+            'recipe_id',
+        ).values_list('recipe_id', 'recipe__updated_at')
+        return md5('|'.join(
+            f'{pk}:{updated_at.timestamp()}' for pk, updated_at in recipes
+        ).encode('utf-8')).hexdigest()
+
+    def get_path(self, user_id, fingerprint):
+        return os.path.join(
+            self.directory, f'{user_id}-{fingerprint}{self.suffix}',
+        )
+
+    @staticmethod
+    def open_path(path):
+        """
+        Открытие по дескриптору: файл читается до конца, даже если его
+        удалят из кэша после открытия, а FileResponse не обращается
+        к нему по имени.
+        """
+        return open(os.open(path, os.O_RDONLY), 'rb')
+
+    def open(self, user_id, fingerprint):
+        try:
+            file = self.open_path(self.get_path(user_id, fingerprint))
+        except FileNotFoundError:
+            return None
+        os.utime(file.fileno())
+        return file
+
+    def store(self, user_id, fingerprint, render):
+        """Запись файла через render(output) и открытие его на чтение."""
+        os.makedirs(self.directory, exist_ok=True)
+        output = NamedTemporaryFile(
+            dir=self.directory, suffix='.tmp', delete=False,
+        )
+        path = self.get_path(user_id, fingerprint)
+        try:
+            with output:
+                render(output)
+            file = self.open_path(output.name)
+            os.replace(output.name, path)
+        except BaseException:
+            os.remove(output.name)
+            raise
+        self.evict(user_id, keep=path)
+        self.shrink(keep=path)
+        return file
+
+    def evict(self, user_id, keep=None):
+        for path in glob(os.path.join(
+            self.directory, f'{user_id}-*{self.suffix}',
+        )):
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def shrink(self, keep=None):
+        entries = []
+        with os.scandir(self.directory) as paths:
+            for entry in paths:
+                if entry.name.endswith(self.suffix) and entry.path != keep:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+shopping_list_files = ShoppingListFileCache(
+    SHOPPING_LIST_CACHE_DIR,
+    SHOPPING_LIST_CACHE_SIZE,
+    '.pdf',
+)
@@ -1,27 +1,95 @@
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe
 from users.models import User
+from .cache import tag_catalog
+from .search import search_recipes
+
+TAGS_ANY = 'any'
+TAGS_ALL = 'all'
+TAGS_MODES = (
+    (TAGS_ANY, 'Любой из тегов'),
+    (TAGS_ALL, 'Все теги'),
+)
 
 
 class IngredientFiltration(SearchFilter):
     search_param = 'name'
 
 
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    """
+    Фильтр рецептов по слагам тегов. Слаги проверяются по справочнику
+    тегов в памяти и переводятся в id, рецепты отбираются через EXISTS
+    по промежуточной таблице, без JOIN и DISTINCT.
+    Режим задается параметром tags_mode: any (по умолчанию) или all.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('distinct', False)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def field(self):
+        self.extra['choices'] = [
+            (tag['slug'], tag['name']) for tag in tag_catalog.get().items
+        ]
+        return super().field
+
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        ids_by_slug = defaultdict(list)
+        for tag in tag_catalog.get().items:
+            ids_by_slug[tag['slug']].append(tag['id'])
+        tag_groups = [ids_by_slug[slug] for slug in set(value)]
+        if self.parent.form.cleaned_data.get('tags_mode') != TAGS_ALL:
+            tag_groups = [[tag_id for ids in tag_groups for tag_id in ids]]
+        for tag_ids in tag_groups:
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('pk'), tag_id__in=tag_ids,
+                ),
+            ))
+        return queryset
+
+
 class RecipeSearchFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagSlugFilter()
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES, method='filter_tags_mode',
+    )
     is_favorited = filters.BooleanFilter(
         field_name='favorites', method='filter_is_favorited',
     )
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='shopping', method='filter_is_in_shopping_cart',
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author',
+            'tags',
+            'tags_mode',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'search',
+        )
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -32,7 +100,3 @@ class RecipeSearchFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user)
         return queryset
-
-    def filter_queryset(self, queryset):
-        queryset = super().filter_queryset(queryset)
-        return queryset.exclude(name='', recipe_ingredients__isnull=True)
@@ -0,0 +1,163 @@
+import resource
+import tracemalloc
+from itertools import islice
+from tempfile import TemporaryFile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from reportlab.pdfbase.ttfonts import TTFont
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.cache import ingredient_catalog
+from api.recipepdf import FONT_PATH, render_shopping_list
+from api.representations import RecipeRepresentationBuilder
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+from recipes.models import Ingredient
+
+DEFAULT_SIZES = {
+    'recipes': [1000, 10000],
+    'pdf': [10, 100, 1000],
+}
+
+
+def get_request(path):
+    return Request(RequestFactory().get(path, HTTP_HOST='localhost'))
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости горячих путей API на текущей базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target', choices=('recipes', 'ingredients', 'pdf'),
+        )
+        parser.add_argument(
+            '--sizes', nargs='+', type=int,
+            help='Размеры выборок; по умолчанию свои для каждой цели',
+        )
+        parser.add_argument('--lookups', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if options['sizes'] is None:
+            options['sizes'] = DEFAULT_SIZES.get(target)
+        getattr(self, f'benchmark_{target}')(**options)
+
+    def benchmark_recipes(self, sizes, **options):
+        request = get_request('/api/recipes/')
+        view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+        serializer = RecipeSerializer(context={'request': request})
+        builder = RecipeRepresentationBuilder(request)
+        renderer = JSONRenderer()
+
+        for size in sizes:
+            start = perf_counter()
+            recipes = list(view.get_queryset()[:size])
+            serialized = [
+                serializer.to_representation(recipe)
+                for recipe in recipes
+            ]
+            serializer_time = perf_counter() - start
+
+            start = perf_counter()
+            built = builder.build_many(list(view.get_read_queryset()[:size]))
+            builder_time = perf_counter() - start
+
+            identical = renderer.render(serialized) == renderer.render(built)
+            self.stdout.write(
+                f'Рецептов: {len(recipes)} (запрошено {size}); '
+                f'RecipeSerializer: {serializer_time:.3f} с; '
+                f'RecipeRepresentationBuilder: {builder_time:.3f} с; '
+                f'вывод совпадает: {"да" if identical else "нет"}',
+            )
+            if not identical:
+                self.stderr.write(self.style.ERROR(
+                    'Представления рецептов различаются.',
+                ))
+
+    def benchmark_ingredients(self, lookups, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write(self.style.WARNING(
+                'Справочник ингредиентов пуст, выполните importcsv.',
+            ))
+            return
+        prefixes = list(islice(
+            (
+                name[:length]
+                for length in (1, 2, 3, 5)
+                for name in names
+                if len(name) >= length
+            ),
+            lookups,
+        ))
+
+        start = perf_counter()
+        for prefix in prefixes:
+            list(Ingredient.objects.filter(name__istartswith=prefix).values(
+                'id', 'name', 'measurement_unit',
+            ))
+        sql_time = perf_counter() - start
+
+        ingredient_catalog.get()
+        start = perf_counter()
+        for prefix in prefixes:
+            ingredient_catalog.get().search_prefix(prefix)
+        index_time = perf_counter() - start
+
+        self.stdout.write(
+            f'Ингредиентов: {len(names)}, запросов: {len(prefixes)}; '
+            f'SQL: {len(prefixes) / sql_time:.0f} запросов/с; '
+            f'индекс в памяти: {len(prefixes) / index_time:.0f} запросов/с',
+        )
+
+    def benchmark_pdf(self, sizes, **options):
+        start = perf_counter()
+        TTFont('robotor', FONT_PATH)
+        font_time = perf_counter() - start
+        self.stdout.write(
+            f'Разбор TTF-шрифта (раньше на каждый PDF): {font_time:.3f} с',
+        )
+        for size in sizes:
+            recipes = [
+                (
+                    f'Рецепт {number}',
+                    [
+                        (f'Ингредиент {number % 50 + i}', 100 + i, 'г')
+                        for i in range(8)
+                    ],
+                )
+                for number in range(size)
+            ]
+            totals = [
+                (f'Ингредиент {number}', 1000 * number, 'г')
+                for number in range(min(size, 50) + 8)
+            ]
+            start = perf_counter()
+            with TemporaryFile() as output:
+                render_shopping_list(
+                    output, recipes, totals, fast_path=False,
+                )
+            paragraph_time = perf_counter() - start
+
+            start = perf_counter()
+            with TemporaryFile() as output:
+                render_shopping_list(output, recipes, totals)
+                pdf_size = output.tell()
+            pdf_time = perf_counter() - start
+
+            tracemalloc.start()
+            with TemporaryFile() as output:
+                render_shopping_list(output, recipes, totals)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(
+                f'Рецептов в списке: {size}; PDF: {pdf_size // 1024} КБ; '
+                f'Paragraph на каждую строку: {paragraph_time:.3f} с; '
+                f'drawString: {pdf_time:.3f} с; пик памяти Python: '
+                f'{peak // 1024} КБ; пиковый RSS процесса: {max_rss} КБ',
+            )
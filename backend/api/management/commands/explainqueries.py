@@ -0,0 +1,143 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+LARGE_TABLES = (
+    'recipes_recipe',
+    'recipes_recipe_tags',
+    'recipes_recipeingredientsmerge',
+    'recipes_favorite',
+    'recipes_cart',
+    'recipes_ingredient',
+    'users_follow',
+    'users_user',
+)
+# SCAN TABLE recipes_recipe AS U0 (до 3.36), SCAN U0 или
+# SCAN recipes_recipe USING INDEX ...: полное чтение — только без USING.
+SQLITE_SCAN = re.compile(
+    r'^SCAN (?:TABLE )?(?P<table>\S+)(?: AS \S+)?(?P<using> USING .*)?$',
+)
+# Псевдонимы таблиц в подзапросах Django: FROM "recipes_cart" U0.
+SQL_ALIAS = re.compile(r'(?:FROM|JOIN) "(?P<table>\w+)" (?P<alias>[A-Z]\d+)\b')
+
+
+def get_endpoints():
+    endpoints = [
+        '/api/recipes/',
+        '/api/recipes/?is_favorited=1',
+        '/api/recipes/?is_in_shopping_cart=1',
+        '/api/recipes/?cursor=',
+        '/api/recipes/?search=суп',
+        '/api/users/',
+        '/api/users/subscriptions/',
+        '/api/tags/',
+        '/api/ingredients/?name=са',
+    ]
+    recipe = Recipe.objects.only('pk', 'author_id').first()
+    if recipe is not None:
+        endpoints += [
+            f'/api/recipes/{recipe.pk}/',
+            f'/api/recipes/?author={recipe.author_id}',
+        ]
+    tag = Tag.objects.only('slug').first()
+    if tag is not None:
+        endpoints.append(f'/api/recipes/?tags={tag.slug}')
+    return endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN для запросов эндпоинтов API: поиск полного '
+        'последовательного чтения больших таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='email пользователя, от имени которого запросы',
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Не считать ошибкой чтение таблиц с меньшим числом строк',
+        )
+
+    def handle(self, *args, **options):
+        client = APIClient(HTTP_HOST='localhost')
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user = users.first()
+        if user is not None:
+            client.force_authenticate(user=user)
+        sizes = self.get_table_sizes()
+        problems = 0
+
+        for endpoint in get_endpoints():
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(endpoint)
+            self.stdout.write(
+                f'{endpoint}: {response.status_code}, '
+                f'запросов: {len(context.captured_queries)}',
+            )
+            for query in context.captured_queries:
+                for table in self.get_scanned_tables(query['sql']):
+                    if sizes.get(table, 0) < options['min_rows']:
+                        continue
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'  Seq Scan {table} ({sizes[table]} строк): '
+                        f'{query["sql"][:200]}',
+                    ))
+
+        if problems:
+            raise CommandError(
+                f'Найдено последовательных чтений больших таблиц: {problems}',
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Последовательных чтений больших таблиц не найдено.',
+        ))
+
+    @staticmethod
+    def get_table_sizes():
+        sizes = {}
+        with connection.cursor() as cursor:
+            for table in LARGE_TABLES:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}',
+                )
+                sizes[table] = cursor.fetchone()[0]
+        return sizes
+
+    @staticmethod
+    def get_scanned_tables(sql):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                nodes = [cursor.fetchone()[0][0]['Plan']]
+                tables = []
+                while nodes:
+                    node = nodes.pop()
+                    nodes.extend(node.get('Plans', ()))
+                    if node['Node Type'] == 'Seq Scan':
+                        tables.append(node['Relation Name'])
+                return tables
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                aliases = {
+                    match['alias']: match['table']
+                    for match in SQL_ALIAS.finditer(sql)
+                }
+                return [
+                    aliases.get(match['table'], match['table'])
+                    for *_, detail in cursor.fetchall()
+                    for match in [SQLITE_SCAN.match(detail)]
+                    if match and not match['using']
+                ]
+        return []
@@ -0,0 +1,64 @@
+from tempfile import TemporaryFile
+from time import monotonic, sleep
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from api.recipepdf import render_cart
+from recipes.models import ShoppingListExport
+
+CLEANUP_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Фоновое формирование PDF списков покупок из очереди заданий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Пауза между проверками пустой очереди, с',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задания из очереди и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        cleaned = None
+        while True:
+            if cleaned is None or monotonic() - cleaned >= CLEANUP_INTERVAL:
+                self.cleanup()
+                cleaned = monotonic()
+            job = ShoppingListExport.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                sleep(options['interval'])
+                continue
+            self.run(job)
+
+    def cleanup(self):
+        deleted = ShoppingListExport.delete_expired()
+        if deleted:
+            self.stdout.write(f'Удалено устаревших выгрузок: {deleted}')
+
+    def run(self, job):
+        try:
+            with TemporaryFile() as output:
+                render_cart(output, job.user)
+                output.seek(0)
+                job.file.save(f'{job.pk}.pdf', File(output), save=False)
+        except Exception as error:
+            self.finish(job, ShoppingListExport.FAILED)
+            self.stderr.write(f'Выгрузка {job.pk}: {error!r}')
+            return
+        if not self.finish(job, ShoppingListExport.DONE):
+            # Задание уже забрал другой воркер по таймауту.
+            job.file.delete(save=False)
+            return
+        self.stdout.write(f'Выгрузка {job.pk} готова')
+
+    def finish(self, job, status):
+        return ShoppingListExport.objects.filter(
+            pk=job.pk, status=ShoppingListExport.RUNNING, started=job.started,
+        ).update(status=status, file=job.file.name)
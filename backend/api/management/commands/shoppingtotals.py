@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredientsMerge, ShoppingTotal
+
+
+def compute_totals():
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            RecipeIngredientsMerge.objects.filter(
+                recipe__shopping__isnull=False,
+            ).values_list(
+                'recipe__shopping__user', 'ingredient',
+            ).annotate(total=Sum('amount')).order_by().iterator()
+        )
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка итогов списков покупок (ShoppingTotal) '
+        'или их сверка с полным пересчетом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить таблицу с пересчетом, не изменяя ее',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def rebuild(self):
+        expected = compute_totals()
+        with transaction.atomic():
+            ShoppingTotal.objects.all().delete()
+            ShoppingTotal.objects.bulk_create(
+                (
+                    ShoppingTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги списков покупок пересобраны: {len(expected)} записей.',
+        ))
+
+    def verify(self):
+        expected = compute_totals()
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingTotal.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount',
+                ).iterator()
+            )
+        }
+        mismatches = [
+            (key, expected.get(key), actual.get(key))
+            for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for (user_id, ingredient_id), want, got in sorted(
+            mismatches, key=lambda mismatch: mismatch[0],
+        )[:20]:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидается {want}, в таблице {got}',
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в итогах списков покупок: {len(mismatches)}. '
+                f'Выполните shoppingtotals без --verify.',
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги списков покупок совпадают: {len(actual)} записей.',
+        ))
@@ -1,5 +1,11 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from rest_framework import mixins, viewsets
 
+from recipes.models import Version
+
 
 class CreateListDestroyViewSet(mixins.CreateModelMixin,
                                mixins.ListModelMixin,
@@ -7,3 +13,78 @@ class CreateListDestroyViewSet(mixins.CreateModelMixin,
                                mixins.RetrieveModelMixin,
                                viewsets.GenericViewSet):
     pass
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve.
+    Наследник возвращает из get_validator_parts части ETag
+    и дату последнего изменения; при совпадении If-None-Match
+    или If-Modified-Since ответ 304 отдается до сериализации.
+    """
+
+    def get_validator_parts(self, request):
+        raise NotImplementedError
+
+    def get_viewer_version(self, request):
+        if not request.user.is_authenticated:
+            return None
+        key = f'user:{request.user.pk}'
+        return Version.get_many(key).get(key)
+
+    def get_validators(self, request):
+        parts, last_modified = self.get_validator_parts(request)
+        if parts is None:
+            return None, None
+        viewer_version = self.get_viewer_version(request)
+        if viewer_version is not None:
+            parts = [*parts, request.user.pk, viewer_version.value]
+            if last_modified is not None:
+                last_modified = max(last_modified, viewer_version.updated_at)
+        etag = quote_etag(md5(
+            '|'.join(str(part) for part in parts).encode('utf-8'),
+        ).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        return etag, last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class CatalogConditionalGetMixin(ConditionalGetMixin):
+    """Условные запросы к справочнику по версии его снимка в памяти."""
+    catalog = None
+
+    def get_validator_parts(self, request):
+        snapshot = self.catalog.get()
+        return (
+            [
+                self.catalog.version_key,
+                snapshot.version,
+                request.get_full_path(),
+            ],
+            snapshot.updated_at,
+        )
+
+    def get_viewer_version(self, request):
+        return None
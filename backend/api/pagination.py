@@ -1,13 +1,186 @@
+import time
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.settings import (COUNT_CACHE_TIMEOUT,
+                               COUNT_ESTIMATE_THRESHOLD)
+
+COUNT_GENERATION_KEY = 'pagination_count_generation'
+
+
+def get_count_generation():
+    return cache.get_or_set(
+        COUNT_GENERATION_KEY, lambda: int(time.time() * 1000), None,
+    )
+
+
+def invalidate_counts():
+    """Сброс всех закэшированных количеств объектов пагинации."""
+    try:
+        cache.incr(COUNT_GENERATION_KEY)
+    except ValueError:
+        get_count_generation()
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор, кэширующий общее количество объектов.
+    На PostgreSQL для больших выборок вместо COUNT(*) берется
+    оценка планировщика, в этом случае count_estimated равен True.
+    """
+
+    def __init__(self, *args, cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.count_estimated = False
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        cached = cache.get(self.cache_key)
+        if cached is None:
+            cached = self.estimate_count()
+            if cached is None:
+                cached = (super().count, False)
+            cache.set(self.cache_key, cached, COUNT_CACHE_TIMEOUT)
+        count, self.count_estimated = cached
+        return count
+
+    def estimate_count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return None
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        rows = int(plan[0]['Plan']['Plan Rows'])
+        if rows < COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return rows, True
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+    count_ignored_params = ('page', 'limit')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=self.get_count_cache_key(request),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_cache_key(self, request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in self.count_ignored_params
+        )
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        digest = md5(
+            f'{request.path}|{user_id}|{params}'.encode('utf-8'),
+        ).hexdigest()
+        return f'pagination_count:{get_count_generation()}:{digest}'
 
     def get_paginated_response(self, data):
         return Response({
             'count': self.page.paginator.count,
+            'count_estimated': self.page.paginator.count_estimated,
             'results': data,
         })
+
+
+class RecipePagination(CustomPagination):
+    """
+    Пагинация рецептов. По умолчанию постраничная, как у CustomPagination.
+    При наличии параметра cursor включается keyset-пагинация
+    по (pub_date, id): следующая страница выбирается условием
+    по последней записи предыдущей, без COUNT(*) и OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    count_ignored_params = ('page', 'limit', 'cursor')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.display_page_controls = False
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param],
+        )
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk),
+            )
+        results = list(
+            queryset.order_by('-pub_date', '-pk')[:page_size + 1],
+        )
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = (
+            self.get_position(results[-1]) if self.has_next else None
+        )
+        return results
+
+    @staticmethod
+    def get_position(item):
+        if isinstance(item, dict):
+            return item['pub_date'], item['id']
+        return item.pub_date, item.pk
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    @staticmethod
+    def encode_cursor(position):
+        pub_date, pk = position
+        token = f'{pub_date.isoformat()}|{pk}'
+        return b64encode(token.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = b64decode(
+                cursor.encode('ascii'), validate=True,
+            ).decode('ascii').split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
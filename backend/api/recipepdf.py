@@ -1,8 +1,9 @@
-from collections import defaultdict
-from io import BytesIO
+import os
+from xml.sax.saxutils import escape
 
-from django.db import models
 from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from reportlab.lib import colors, pagesizes
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
@@ -10,11 +11,13 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Paragraph
 
-from api.serializers import RecipeIngredientsMerge
-from recipes.models import Cart
+from api.cache import shopping_list_files
+from api.shopping import (get_cart_recipes, get_recipe_lines,
+                          iter_shopping_list)
 
 
 FONT_PATH = 'static/robotor.ttf'
+FONT_NAME = 'robotor'
 PAGE_WIDTH, PAGE_HEIGHT = pagesizes.A4
 MARGIN = 50
 BODY_X, BODY_Y = MARGIN, MARGIN
@@ -29,174 +32,170 @@ INGREDIENT_LINE_HEIGHT = 15
 INGREDIENT_SPACE_AFTER = 20
 INGREDIENT_SPACE_BEFORE = 0
 INGREDIENT_LEADING = 12
-QUANTITY = 1000
+TITLE = 'Список ингредиентов для выбранных рецептов'
+TOTAL_TITLE = 'Общее количество ингредиентов'
+
+
+TITLE_STYLE = ParagraphStyle(
+    name='Title',
+    fontName=FONT_NAME,
+    fontSize=TITLE_FONT_SIZE,
+    textColor=colors.black,
+    spaceAfter=20,
+    spaceBefore=0,
+    leading=16,
+    fontWeight='bold',
+)
+SECTION_STYLE = ParagraphStyle(
+    name='RecipeName',
+    fontName=FONT_NAME,
+    fontSize=RECIPE_NAME_FONT_SIZE,
+    textColor=colors.black,
+    spaceAfter=20,
+    spaceBefore=0,
+    leading=16,
+)
+INGREDIENT_STYLE = ParagraphStyle(
+    name='Ingredient',
+    fontName=FONT_NAME,
+    fontSize=PAGE_FONT_SIZE,
+    textColor=colors.black,
+    spaceAfter=INGREDIENT_SPACE_AFTER,
+    spaceBefore=INGREDIENT_SPACE_BEFORE,
+    leading=INGREDIENT_LEADING,
+)
+
+
+def register_fonts():
+    """Разбор TTF-файла шрифта один раз на процесс."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class ShoppingListLayout:
+    """
+    Раскладка списка покупок по страницам: при нехватке места
+    начинается новая страница с тем же заголовком.
+    Строки, которые помещаются по ширине, выводятся drawString
+    без разбора разметки и переноса в Paragraph.
+    """
+
+    def __init__(self, output, fast_path=True):
+        register_fonts()
+        self.page = canvas.Canvas(output, pagesize=pagesizes.A4)
+        self.fast_path = fast_path
+        self.title = Paragraph(TITLE, TITLE_STYLE)
+        self.height = None
+
+    def start_page(self):
+        page = self.page
+        page.setFillColor(colors.darkorange)
+        page.rect(0, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=True, stroke=False)
+        page.setFillColor(colors.black)
+
+        self.title.wrapOn(page, BODY_WIDTH, BODY_HEIGHT)
+        self.title.drawOn(page, TITLE_X, TITLE_Y)
+
+        page.setFillColor(colors.darkorange)
+        page.rect(
+            BODY_X, BODY_Y, BODY_WIDTH,
+            BODY_HEIGHT - TITLE_BOTTOM_SPACE, fill=True, stroke=False,
+        )
+        page.setFillColor(colors.black)
+        page.setFont(FONT_NAME, PAGE_FONT_SIZE)
+        self.height = BODY_Y + BODY_HEIGHT - TITLE_BOTTOM_SPACE
+
+    def ensure_space(self, height):
+        if self.height is None:
+            self.start_page()
+        elif self.height - height < BODY_Y:
+            self.page.showPage()
+            self.start_page()
+
+    def draw_paragraph(self, paragraph, x, width, step):
+        _, height = paragraph.wrapOn(self.page, width, BODY_HEIGHT)
+        self.ensure_space(max(height, step))
+        paragraph.drawOn(self.page, x, self.height)
+        self.height -= max(step, height)
+
+    def draw_line(self, text, x, width, step):
+        if self.fast_path and pdfmetrics.stringWidth(
+            text, FONT_NAME, PAGE_FONT_SIZE,
+        ) <= width:
+            self.ensure_space(step)
+            self.page.setFont(FONT_NAME, PAGE_FONT_SIZE)
+            self.page.drawString(
+                x, self.height + INGREDIENT_LEADING - PAGE_FONT_SIZE, text,
+            )
+            self.height -= step
+        else:
+            self.draw_paragraph(
+                Paragraph(escape(text), INGREDIENT_STYLE), x, width, step,
+            )
 
+    def draw_section(self, title):
+        self.ensure_space(INGREDIENT_SPACE_AFTER + INGREDIENT_LINE_HEIGHT)
+        self.draw_paragraph(
+            Paragraph(title, SECTION_STYLE),
+            TITLE_X, BODY_WIDTH, INGREDIENT_SPACE_AFTER,
+        )
 
-def format_quantity(quantity, measurement_unit):
-    if measurement_unit == 'г':
-        if quantity >= QUANTITY:
-            quantity /= QUANTITY
-            measurement_unit = 'кг'
-    elif measurement_unit == 'шт':
-        measurement_unit = 'штук'
-    return quantity, measurement_unit
+    def draw_ingredients(self, ingredients):
+        for i, (name, amount, measurement_unit) in enumerate(
+            ingredients, start=1,
+        ):
+            self.draw_line(
+                f'{i}. {name} – {amount} {measurement_unit}',
+                BODY_X + INGREDIENT_NUMBER_INDENT,
+                BODY_WIDTH - INGREDIENT_NUMBER_INDENT,
+                INGREDIENT_LINE_HEIGHT,
+            )
+        self.height -= INGREDIENT_SPACE_AFTER
+
+    def save(self):
+        if self.height is None:
+            self.start_page()
+        self.page.showPage()
+        self.page.save()
+
+
+def render_shopping_list(output, recipes, totals, fast_path=True):
+    """
+    Запись PDF в output. recipes: пары (название, ингредиенты),
+    ингредиенты и totals: готовые к выводу тройки
+    (название, количество, единица).
+    """
+    layout = ShoppingListLayout(output, fast_path)
+    for name, ingredients in recipes:
+        layout.draw_section(f'<b>Рецепт:</b> {escape(name)}')
+        layout.draw_ingredients(ingredients)
+    layout.draw_section(TOTAL_TITLE)
+    layout.draw_ingredients(totals)
+    layout.save()
+
+
+def render_cart(output, user):
+    recipes = (
+        (recipe.name, get_recipe_lines(recipe))
+        for recipe in get_cart_recipes(user)
+    )
+    render_shopping_list(output, recipes, iter_shopping_list(user))
 
 
 def recipe_pdf_download(request):
-    shopping_cart = Cart.objects.filter(user=request.user)
-    buffer = BytesIO()
-    pdfmetrics.registerFont(TTFont('robotor', FONT_PATH))
-    page = canvas.Canvas(buffer, pagesize=pagesizes.A4)
-
-    page.setFillColor(colors.darkorange)
-    page.rect(0, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=True, stroke=False)
-    page.setFillColor(colors.black)
-
-    title_style = ParagraphStyle(
-        name='Title',
-        fontName='robotor',
-        fontSize=TITLE_FONT_SIZE,
-        textColor=colors.black,
-        spaceAfter=20,
-        spaceBefore=0,
-        leading=16,
-        fontWeight='bold',
-    )
-    title_paragraph = Paragraph(
-        'Список ингредиентов для выбранных рецептов',
-        title_style,
-    )
-    title_paragraph.wrapOn(page, BODY_WIDTH, BODY_HEIGHT)
-    title_paragraph.drawOn(page, TITLE_X, TITLE_Y)
-
-    page.setFillColor(colors.darkorange)
-    page.rect(
-        BODY_X, BODY_Y, BODY_WIDTH,
-        BODY_HEIGHT - TITLE_BOTTOM_SPACE, fill=True, stroke=False,
-    )
-    page.setFillColor(colors.black)
-    page.setFont('robotor', PAGE_FONT_SIZE)
-    height = BODY_Y + BODY_HEIGHT - TITLE_BOTTOM_SPACE
-
-    for shopping_item in shopping_cart:
-        recipe = shopping_item.recipe
-        recipe_name = recipe.name
-
-        ingredients = RecipeIngredientsMerge.objects.filter(
-            recipe=recipe).values(
-            'ingredient__name', 'ingredient__measurement_unit',
-        ).annotate(total_amount=models.Sum('amount'))
-
-        recipe_name_style = ParagraphStyle(
-            name='RecipeName',
-            fontName='robotor',
-            fontSize=RECIPE_NAME_FONT_SIZE,
-            textColor=colors.black,
-            spaceAfter=20,
-            spaceBefore=0,
-            leading=16,
-        )
-        recipe_name_paragraph = Paragraph(
-            f'<b>Рецепт:</b> {recipe_name}',
-            recipe_name_style,
-        )
-        recipe_name_paragraph.wrapOn(page, BODY_WIDTH, BODY_HEIGHT)
-        recipe_name_paragraph.drawOn(page, TITLE_X, height)
-        height -= INGREDIENT_SPACE_AFTER
-
-        for i, ingredient in enumerate(ingredients, start=1):
-            ingredient_name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            total_amount = ingredient['total_amount']
-            total_amount, measurement_unit = format_quantity(
-                total_amount, measurement_unit)
-
-            ingredient_style = ParagraphStyle(
-                name='Ingredient',
-                fontName='robotor',
-                fontSize=PAGE_FONT_SIZE,
-                textColor=colors.black,
-                spaceAfter=INGREDIENT_SPACE_AFTER,
-                spaceBefore=INGREDIENT_SPACE_BEFORE,
-                leading=INGREDIENT_LEADING,
+    user = request.user
+    fingerprint = shopping_list_files.get_fingerprint(user)
+    etag = quote_etag(fingerprint)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        file = shopping_list_files.open(user.pk, fingerprint)
+        if file is None:
+            file = shopping_list_files.store(
+                user.pk, fingerprint, lambda output: render_cart(output, user),
             )
-            ingredient_text = (
-                f'{i}. {ingredient_name} – {total_amount} '
-                f'{measurement_unit}'
-            )
-            ingredient_paragraph = Paragraph(ingredient_text, ingredient_style)
-            ingredient_paragraph.wrapOn(
-                page, BODY_WIDTH - INGREDIENT_NUMBER_INDENT, BODY_HEIGHT)
-            ingredient_paragraph.drawOn(
-                page, BODY_X + INGREDIENT_NUMBER_INDENT, height)
-            height -= INGREDIENT_LINE_HEIGHT
-
-        height -= INGREDIENT_SPACE_AFTER
-
-    ingredient_quantities = defaultdict(float)
-    ingredient_measurement_units = {}
-    for shopping_item in shopping_cart:
-        recipe = shopping_item.recipe
-        ingredients = RecipeIngredientsMerge.objects.filter(
-            recipe=recipe).values(
-            'ingredient__name', 'ingredient__measurement_unit',
-        ).annotate(total_amount=models.Sum('amount'))
-
-        for ingredient in ingredients:
-            ingredient_name = ingredient['ingredient__name']
-            total_amount = ingredient['total_amount']
-            total_amount, measurement_unit = format_quantity(
-                total_amount, ingredient['ingredient__measurement_unit'])
-            ingredient_quantities[ingredient_name] += total_amount
-            ingredient_measurement_units[ingredient_name] = measurement_unit
-
-    total_ingredients_title_style = ParagraphStyle(
-        name='TotalIngredientsTitle',
-        fontName='robotor',
-        fontSize=RECIPE_NAME_FONT_SIZE,
-        textColor=colors.black,
-        spaceAfter=20,
-        spaceBefore=0,
-        leading=16,
-        fontWeight='bold',
-    )
-    total_ingredients_paragraph = Paragraph(
-        'Общее количество ингредиентов',
-        total_ingredients_title_style,
-    )
-    total_ingredients_paragraph.wrapOn(page, BODY_WIDTH, BODY_HEIGHT)
-    total_ingredients_paragraph.drawOn(page, TITLE_X, height)
-    height -= INGREDIENT_SPACE_AFTER
-
-    for i, (ingredient_name, total_amount) in enumerate(
-        ingredient_quantities.items(), start=1,
-    ):
-
-        measurement_unit = ingredient_measurement_units[ingredient_name]
-        ingredient_style = ParagraphStyle(
-            name='Ingredient',
-            fontName='robotor',
-            fontSize=PAGE_FONT_SIZE,
-            textColor=colors.black,
-            spaceAfter=INGREDIENT_SPACE_AFTER,
-            spaceBefore=INGREDIENT_SPACE_BEFORE,
-            leading=INGREDIENT_LEADING,
+        response = FileResponse(
+            file, as_attachment=True, filename='shopping_list.pdf',
         )
-        ingredient_text = (
-            f'{i}. {ingredient_name} – {total_amount} {measurement_unit}')
-        ingredient_paragraph = Paragraph(ingredient_text, ingredient_style)
-        ingredient_paragraph.wrapOn(
-            page, BODY_WIDTH - INGREDIENT_NUMBER_INDENT, BODY_HEIGHT)
-        ingredient_paragraph.drawOn(
-            page, BODY_X + INGREDIENT_NUMBER_INDENT, height)
-        height -= INGREDIENT_LINE_HEIGHT
-
-    height -= INGREDIENT_SPACE_AFTER
-
-    page.showPage()
-    page.save()
-    buffer.seek(0)
-
-    return FileResponse(
-        buffer, as_attachment=True, filename='shopping_list.pdf',
-    )
+        response['Content-Length'] = os.fstat(file.fileno()).st_size
+    response['ETag'] = etag
+    return response
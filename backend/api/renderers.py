@@ -0,0 +1,76 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class PDFRenderer(BaseRenderer):
+    """PDF формируется во view, рендерер нужен для согласования формата."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Потоковый вывод списка покупок из троек
+    (название, количество, единица измерения).
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield 'Список ингредиентов для выбранных рецептов\n\n'
+        for i, (name, amount, measurement_unit) in enumerate(rows, start=1):
+            yield f'{i}. {name} – {amount} {measurement_unit}\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for name, amount, measurement_unit in rows:
+            yield separator + json.dumps(
+                {
+                    'name': name,
+                    'amount': amount,
+                    'measurement_unit': measurement_unit,
+                },
+                ensure_ascii=False,
+            )
+            separator = ','
+        yield ']' if separator == ',' else '[]'
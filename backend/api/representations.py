@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+from recipes.models import Recipe, RecipeIngredientsMerge
+from users.models import User
+from .cache import get_cached_representations, recipe_cache_key, tag_catalog
+
+RECIPE_ROW_FIELDS = (
+    'id',
+    'name',
+    'image',
+    'text',
+    'cooking_time',
+    'author_id',
+    'pub_date',
+    'updated_at',
+    'is_favorited',
+    'is_in_shopping_cart',
+    'is_author_subscribed',
+)
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+class RecipeRepresentationBuilder:
+    """
+    Представление рецептов для чтения без сериализаторов DRF.
+    Строится из строк values() и совпадает с выводом RecipeSerializer.
+    """
+
+    def __init__(self, request, tags_version=None):
+        self.request = request
+        self.image_storage = Recipe._meta.get_field('image').storage
+        self.tags = tag_catalog.get(tags_version)
+
+    def build(self, rows):
+        return get_cached_representations(
+            rows,
+            [
+                recipe_cache_key(
+                    row['id'], row['updated_at'], self.request,
+                    self.tags.version,
+                )
+                for row in rows
+            ],
+            build_many=self.build_many,
+            overlay=self.overlay_viewer_fields,
+        )
+
+    def build_many(self, rows):
+        recipe_ids = [row['id'] for row in rows]
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        authors = self.get_authors({row['author_id'] for row in rows})
+        return [
+            {
+                'id': row['id'],
+                'tags': tags[row['id']],
+                'author': dict(
+                    authors[row['author_id']],
+                    is_subscribed=row['is_author_subscribed'],
+                ),
+                'ingredients': ingredients[row['id']],
+                'is_favorited': row['is_favorited'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'name': row['name'],
+                'image': self.get_image_url(row['image']),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def overlay_viewer_fields(data, row):
+        data = dict(
+            data,
+            is_favorited=row['is_favorited'],
+            is_in_shopping_cart=row['is_in_shopping_cart'],
+        )
+        data['author'] = dict(
+            data['author'], is_subscribed=row['is_author_subscribed'],
+        )
+        return data
+
+    def get_tags(self, recipe_ids):
+        catalog = self.tags
+        tag_ids = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).values_list('recipe_id', 'tag_id')
+        for recipe_id, tag_id in rows:
+            if tag_id in catalog.by_id:
+                tag_ids[recipe_id].append(tag_id)
+        tags = defaultdict(list)
+        for recipe_id, ids in tag_ids.items():
+            tags[recipe_id] = [
+                dict(catalog.by_id[tag_id])
+                for tag_id in sorted(ids, key=catalog.positions.get)
+            ]
+        return tags
+
+    @staticmethod
+    def get_ingredients(recipe_ids):
+        ingredients = defaultdict(list)
+        rows = RecipeIngredientsMerge.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).order_by('pk').values_list(
+            'recipe_id',
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount',
+        )
+        for recipe_id, ingredient_id, name, measurement_unit, amount in rows:
+            ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    @staticmethod
+    def get_authors(author_ids):
+        return {
+            author['id']: author
+            for author in User.objects.filter(
+                pk__in=author_ids,
+            ).values(*AUTHOR_FIELDS)
+        }
+
+    def get_image_url(self, name):
+        if not name:
+            return None
+        url = self.image_storage.url(name)
+        if self.request is None:
+            return url
+        return self.request.build_absolute_uri(url)
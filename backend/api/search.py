@@ -0,0 +1,159 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from foodgram.settings import SEARCH_CONFIG
+from recipes.models import Ingredient, Recipe
+
+SIMILARITY_THRESHOLD = 0.3
+WORD_SIMILARITY_THRESHOLD = 0.6
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def fold_name(name):
+    """Приведение названия к виду для поиска без учета регистра и ё."""
+    return ' '.join(name.casefold().replace('ё', 'е').split())
+
+
+def word_trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def split_words(text):
+    return re.findall(r'\w+', fold_name(text))
+
+
+class TrigramIndex:
+    """
+    Индекс триграмм в памяти по правилам pg_trgm: похожесть
+    всей строки и похожесть на отдельное слово названия.
+    Используется вместо pg_trgm, если база данных не PostgreSQL.
+    """
+
+    def __init__(self, texts):
+        self.words = []
+        self.grams = []
+        self.postings = defaultdict(set)
+        for position, text in enumerate(texts):
+            words = [word_trigrams(word) for word in split_words(text)]
+            grams = set().union(*words)
+            self.words.append(words)
+            self.grams.append(grams)
+            for gram in grams:
+                self.postings[gram].add(position)
+
+    def search(self, query):
+        """Позиции похожих строк по убыванию похожести."""
+        query_grams = set().union(
+            *(word_trigrams(word) for word in split_words(query)),
+        )
+        if not query_grams:
+            return []
+        candidates = set().union(
+            *(self.postings.get(gram, ()) for gram in query_grams),
+        )
+        ranked = []
+        for position in candidates:
+            grams = self.grams[position]
+            similarity = (
+                len(query_grams & grams) / len(query_grams | grams)
+            )
+            word_similarity = max(
+                len(query_grams & word) / len(query_grams)
+                for word in self.words[position]
+            )
+            if (
+                similarity >= SIMILARITY_THRESHOLD
+                or word_similarity >= WORD_SIMILARITY_THRESHOLD
+            ):
+                ranked.append(
+                    (-max(similarity, word_similarity), position),
+                )
+        return [position for _, position in sorted(ranked)]
+
+
+def search_similar_sql(query, limit=None):
+    column = f'"{Ingredient._meta.db_table}"."name"'
+    queryset = Ingredient.objects.extra(
+        where=[f'({column} %% %s OR %s <%% {column})'],
+        params=[query, query],
+    ).annotate(
+        rank=RawSQL(
+            f'GREATEST(similarity({column}, %s), '
+            f'word_similarity(%s, {column}))',
+            (query, query),
+        ),
+    ).order_by('-rank', 'name').values(*INGREDIENT_FIELDS)
+    if limit is not None:
+        queryset = queryset[:limit]
+    return list(queryset)
+
+
+def search_ingredients(snapshot, query, limit=None):
+    """
+    Ранжированный поиск ингредиентов: сначала совпадения по началу
+    названия, затем похожие по триграммам (опечатки, слово внутри
+    названия). На PostgreSQL похожие ищутся через pg_trgm,
+    иначе по индексу триграмм снимка справочника.
+    """
+    results = snapshot.search_prefix(query)
+    if limit is not None and len(results) >= limit:
+        return results[:limit]
+    found = {item['id'] for item in results}
+    if connection.vendor == 'postgresql':
+        similar = search_similar_sql(
+            query, None if limit is None else limit + len(results),
+        )
+    else:
+        similar = [
+            snapshot.items[position]
+            for position in snapshot.trigram_index.search(query)
+        ]
+    results.extend(item for item in similar if item['id'] not in found)
+    return results if limit is None else results[:limit]
+
+
+def update_recipe_search_vector(recipe_id):
+    """Пересчет поискового вектора рецепта (только PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return
+    Recipe.objects.filter(pk=recipe_id).update(
+        search_vector=(
+            SearchVector('name', config=SEARCH_CONFIG, weight='A')
+            + SearchVector('text', config=SEARCH_CONFIG, weight='B')
+        ),
+    )
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск по названию и описанию рецепта
+    с сортировкой по релевантности. На PostgreSQL используется
+    сохраненный tsvector с GIN-индексом, иначе поиск по подстрокам.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch',
+        )
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        )
+    else:
+        for word in value.split():
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(text__icontains=word),
+            )
+        queryset = queryset.annotate(
+            search_rank=Case(
+                When(name__icontains=value, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -22,6 +22,8 @@ from recipes.models import (
     Ingredient,
     Recipe,
     RecipeIngredientsMerge,
+    ShoppingListExport,
+    ShoppingTotal,
     Tag,
 )
 from users.models import User
@@ -99,6 +101,8 @@ class RecipeSerializer(ModelSerializer):
     image = Base64ImageField(max_length=None)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             if Favorite.objects.filter(recipe=obj, user=request.user).exists():
@@ -106,6 +110,8 @@ class RecipeSerializer(ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if (
             request.user.is_authenticated
@@ -166,6 +172,13 @@ class ListRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class ShoppingListExportSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ShoppingListExport
+        fields = ('id', 'status', 'created')
+
+
 class RecipeIngredientSerializer(serializers.Serializer):
 
     id = serializers.IntegerField()
@@ -237,6 +250,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
+        ShoppingTotal.lock_recipe(instance.pk)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
@@ -246,8 +260,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags', [])
 
         instance.tags.set(tags)
+        old_amounts = ShoppingTotal.get_recipe_amounts(instance.pk)
         instance.ingredients.clear()
         self.save_ingredients(instance, ingredients)
+        ShoppingTotal.update_recipe(instance.pk, old_amounts)
 
         if 'image' in validated_data:
             instance.image = validated_data['image']
@@ -278,6 +294,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 ),
             )
         RecipeIngredientsMerge.objects.bulk_create(ingredients_list)
+        recipe.ingredients_count = len(ingredients_list)
+        recipe.save(update_fields=('ingredients_count',))
 
     def to_representation(self, instance):
         serializer = RecipeSerializer(
@@ -0,0 +1,106 @@
+from django.db.models import (Case, CharField, F, IntegerField, Prefetch, Sum,
+                              Value, When)
+
+from recipes.models import Recipe, RecipeIngredientsMerge, ShoppingTotal
+
+# Единица измерения ингредиента -> (базовая единица, множитель).
+BASE_UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'шт': ('шт', 1),
+    'шт.': ('шт', 1),
+}
+# Базовая единица -> (крупная единица, множитель) для вывода.
+LARGE_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+UNIT_NAMES = {'шт': 'штук'}
+
+
+def normalize_quantity(quantity, measurement_unit):
+    """Количество в базовой единице семейства (г, мл, шт)."""
+    base_unit, factor = BASE_UNITS.get(
+        measurement_unit, (measurement_unit, 1),
+    )
+    return quantity * factor, base_unit
+
+
+def format_quantity(quantity, base_unit):
+    """Вывод количества в базовой единице: крупная единица от 1000."""
+    if base_unit in LARGE_UNITS:
+        large_unit, factor = LARGE_UNITS[base_unit]
+        if quantity >= factor:
+            quantity = round(quantity / factor, 3)
+            if quantity.is_integer():
+                quantity = int(quantity)
+            base_unit = large_unit
+    return quantity, UNIT_NAMES.get(base_unit, base_unit)
+
+
+def get_unit_case(index, default, output_field):
+    return Case(
+        *(
+            When(ingredient__measurement_unit=unit, then=Value(values[index]))
+            for unit, values in BASE_UNITS.items()
+        ),
+        default=default,
+        output_field=output_field,
+    )
+
+
+def get_cart_recipes(user):
+    """Рецепты из списка покупок с ингредиентами: два запроса."""
+    return Recipe.objects.filter(shopping__user=user).order_by(
+        'shopping__id',
+    ).only('id', 'name').prefetch_related(
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredientsMerge.objects.select_related(
+                'ingredient',
+            ).order_by('pk'),
+        ),
+    )
+
+
+def get_shopping_totals(user):
+    """
+    Суммарное количество ингредиентов в списке покупок одним запросом
+    к ShoppingTotal. Количество переводится в базовую единицу внутри Sum,
+    поэтому один ингредиент в граммах и килограммах складывается
+    в одну строку.
+    """
+    return ShoppingTotal.objects.filter(user=user).annotate(
+        base_unit=get_unit_case(
+            0, F('ingredient__measurement_unit'), CharField(),
+        ),
+    ).values('ingredient__name', 'base_unit').annotate(
+        total_amount=Sum(
+            F('amount') * get_unit_case(1, Value(1), IntegerField()),
+            output_field=IntegerField(),
+        ),
+    ).order_by('ingredient__name', 'base_unit')
+
+
+def get_recipe_lines(recipe):
+    """Строки ингредиентов рецепта: (название, количество, единица)."""
+    return [
+        (
+            recipe_ingredient.ingredient.name,
+            *format_quantity(*normalize_quantity(
+                recipe_ingredient.amount,
+                recipe_ingredient.ingredient.measurement_unit,
+            )),
+        )
+        for recipe_ingredient in recipe.recipe_ingredients.all()
+    ]
+
+
+def iter_shopping_list(user):
+    """Строки итогового списка: (название, количество, единица)."""
+    for name, amount, base_unit in get_shopping_totals(user).values_list(
+        'ingredient__name', 'total_amount', 'base_unit',
+    ).iterator():
+        yield (name, *format_quantity(amount, base_unit))
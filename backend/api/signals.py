@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            ShoppingListExport, ShoppingTotal, Tag, Version)
+from users.models import Follow, User
+from .cache import ingredient_catalog, shopping_list_files, tag_catalog
+from .pagination import invalidate_counts
+from .search import update_recipe_search_vector
+
+
+def touch_recipes(**lookups):
+    """
+    Обновление updated_at у рецептов, чье представление изменилось
+    вместе со связанным объектом, чтобы устарели их записи в кэше.
+    """
+    Recipe.objects.filter(**lookups).update(updated_at=timezone.now())
+    Version.bump('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=User)
+def reset_pagination_counts(sender, **kwargs):
+    invalidate_counts()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipes_version(sender, **kwargs):
+    Version.bump('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(sender, instance, update_fields, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    update_recipe_search_vector(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def reset_pagination_counts_on_signup(sender, created, **kwargs):
+    if created:
+        invalidate_counts()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    touch_recipes(author=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, **kwargs):
+    touch_recipes(tags=instance)
+    Version.bump('tags')
+    tag_catalog.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_changed_ingredient_recipes(sender, instance, created, **kwargs):
+    """
+    Новый ингредиент еще не входит в рецепты: меняется только справочник.
+    Сохранение без изменений ничего не сбрасывает.
+    """
+    if not instance.has_changed():
+        return
+    if not created:
+        touch_recipes(ingredients=instance)
+    Version.bump('ingredients')
+    ingredient_catalog.invalidate()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    instance.recipe_ids = list(Recipe.objects.filter(
+        ingredients=instance,
+    ).values_list('pk', flat=True))
+    touch_recipes(pk__in=instance.recipe_ids)
+    Version.bump('ingredients')
+    ingredient_catalog.invalidate()
+
+
+@receiver(post_delete, sender=Ingredient)
+def recount_ingredient_recipes(sender, instance, **kwargs):
+    """Каскад уже удалил строки рецептов с этим ингредиентом."""
+    if instance.recipe_ids:
+        Recipe.update_ingredients_counts(instance.recipe_ids)
+        invalidate_counts()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def bump_user_version(sender, instance, **kwargs):
+    Version.bump(f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follower_version(sender, instance, **kwargs):
+    Version.bump(f'user:{instance.follower_id}')
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def evict_shopping_list(sender, instance, **kwargs):
+    shopping_list_files.evict(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def evict_recipe_shopping_lists(sender, instance, **kwargs):
+    for user_id in Cart.objects.filter(recipe=instance).values_list(
+        'user_id', flat=True,
+    ):
+        shopping_list_files.evict(user_id)
+
+
+@receiver(post_delete, sender=ShoppingListExport)
+def delete_export_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver(post_save, sender=Cart)
+def add_shopping_totals(sender, instance, created, **kwargs):
+    if created:
+        with transaction.atomic():
+            ShoppingTotal.lock_recipe(instance.recipe_id)
+            ShoppingTotal.add(
+                [instance.user_id],
+                ShoppingTotal.get_recipe_amounts(instance.recipe_id),
+            )
+
+
+@receiver(pre_delete, sender=Cart)
+def subtract_shopping_totals(sender, instance, **kwargs):
+    """
+    Итоги уменьшаются до удаления: при каскадном удалении рецепта
+    его ингредиенты удаляются раньше записей списка покупок.
+    """
+    with transaction.atomic():
+        ShoppingTotal.lock_recipe(instance.recipe_id)
+        ShoppingTotal.add(
+            [instance.user_id],
+            ShoppingTotal.get_recipe_amounts(instance.recipe_id),
+            sign=-1,
+        )
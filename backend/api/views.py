@@ -1,30 +1,54 @@
 from django.db import transaction
-from django.db.models import Count, OuterRef, Subquery
-from django.shortcuts import get_object_or_404
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from api.recipepdf import recipe_pdf_download
+from foodgram.settings import SHOPPING_LIST_ASYNC_THRESHOLD
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredientsMerge, Tag)
+                            RecipeIngredientsMerge, ShoppingListExport, Tag,
+                            Version)
+from users.models import Follow
+from .cache import ingredient_catalog, tag_catalog
 from .filters import IngredientFiltration, RecipeSearchFilter
-from .mixins import CreateListDestroyViewSet
+from .mixins import (CatalogConditionalGetMixin, ConditionalGetMixin,
+                     CreateListDestroyViewSet)
+from .pagination import RecipePagination
 from .permissions import IsRecipeAuthorOrReadOnly
+from .renderers import (PDFRenderer, ShoppingListCSVRenderer,
+                        ShoppingListJSONRenderer, ShoppingListTextRenderer)
+from .representations import RECIPE_ROW_FIELDS, RecipeRepresentationBuilder
+from .search import search_ingredients
 from .serializers import (IngredientNoAmountSerializer, ListRecipeSerializer,
                           RecipeCreateSerializer, RecipeSerializer,
-                          TagSerializers)
+                          ShoppingListExportSerializer, TagSerializers)
+from .shopping import iter_shopping_list
 
 
-class TagViewSet(CreateListDestroyViewSet):
+class TagViewSet(CatalogConditionalGetMixin, CreateListDestroyViewSet):
+    catalog = tag_catalog
     queryset = Tag.objects.all()
     serializer_class = TagSerializers
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.list_catalog, request, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def list_catalog(self, request, *args, **kwargs):
+        return Response(self.catalog.get().items)
+
+
+class IngredientViewSet(CatalogConditionalGetMixin,
+                        viewsets.ReadOnlyModelViewSet):
+    catalog = ingredient_catalog
     queryset = Ingredient.objects.all()
     serializer_class = IngredientNoAmountSerializer
     permission_classes = (IsRecipeAuthorOrReadOnly,)
@@ -33,24 +57,135 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (IngredientFiltration,)
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.list_catalog, request, *args, **kwargs)
+
+    def list_catalog(self, request, *args, **kwargs):
+        catalog = self.catalog.get()
+        limit = self.get_limit(request)
+        name = request.query_params.get(IngredientFiltration.search_param)
+        if name is None:
+            return Response(catalog.items[:limit])
+        return Response(search_ingredients(catalog, name, limit))
+
+    @staticmethod
+    def get_limit(request):
+        limit = request.query_params.get('limit')
+        if limit is None:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError(
+                {'limit': 'Должно быть целым положительным числом.'},
+            )
+        return limit
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.annotate(
-        total_ingredients_count=Subquery(
-            RecipeIngredientsMerge.objects.filter(
-                recipe=OuterRef('pk')).values('recipe').annotate(
-                count=Count('id'),
-            ).values('count')[:1],
-        ),
-    ).filter(
-        recipe_ingredients__isnull=False,
-    ).exclude(name='', recipe_ingredients__isnull=True).distinct()
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.filter(ingredients_count__gt=0)
     serializer_class = RecipeSerializer
     permission_classes = (IsRecipeAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeSearchFilter
+    pagination_class = RecipePagination
     http_method_names = ('get', 'post', 'delete', 'patch')
 
+    def annotate_viewer_flags(self, queryset):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk')),
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk')),
+            ),
+        )
+
+    def get_subscription_flag(self, author_ref):
+        user = self.request.user
+        if not user.is_authenticated:
+            return Value(False, output_field=BooleanField())
+        return Exists(
+            Follow.objects.filter(follower=user, author=OuterRef(author_ref)),
+        )
+
+    def get_queryset(self):
+        queryset = self.annotate_viewer_flags(super().get_queryset())
+        return queryset.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('name', 'pk')),
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredientsMerge.objects.select_related(
+                    'ingredient',
+                ).order_by('pk'),
+            ),
+        )
+
+    def get_read_queryset(self):
+        """Строки рецептов для RecipeRepresentationBuilder."""
+        return self.annotate_viewer_flags(self.queryset).annotate(
+            is_author_subscribed=self.get_subscription_flag('author'),
+        ).values(*RECIPE_ROW_FIELDS)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.list_rows, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(self.retrieve_row, request, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_read_queryset())
+        page = self.paginate_queryset(queryset)
+        builder = self.get_representation_builder(request)
+        if page is None:
+            return Response(builder.build(list(queryset)))
+        return self.get_paginated_response(builder.build(page))
+
+    def retrieve_row(self, request, *args, **kwargs):
+        row = get_object_or_404(
+            self.filter_queryset(self.get_read_queryset()),
+            pk=self.kwargs['pk'],
+        )
+        return Response(
+            self.get_representation_builder(request).build([row])[0],
+        )
+
+    def get_validator_parts(self, request):
+        """
+        Версия 'recipes' растет при сохранении и удалении любого рецепта,
+        поэтому валидаторы не требуют запросов по всей выборке.
+        Версия тегов читается тем же запросом и передается построителю
+        представлений, чтобы теги в ответе совпадали с ETag.
+        """
+        versions = Version.get_many('recipes', 'tags')
+        self.tags_version = versions.get('tags')
+        version = versions.get('recipes')
+        if version is None:
+            return None, None
+        tags_version = self.tags_version.value if self.tags_version else 0
+        return (
+            [
+                version.value,
+                tags_version,
+                request.get_full_path(),
+                request.get_host(),
+            ],
+            version.updated_at,
+        )
+
+    def get_representation_builder(self, request):
+        return RecipeRepresentationBuilder(
+            request, getattr(self, 'tags_version', None),
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -126,8 +261,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, recipe_id, 'shopping_cart',
         )
 
+    def handle_exception(self, exc):
+        if self.action == 'download_shopping_cart':
+            # Ошибки отдаются в JSON, а не в формате списка покупок.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
     @action(detail=False,
-            methods=['get'],
-            permission_classes=[IsAuthenticated])
+            methods=['get', 'post'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[
+                PDFRenderer,
+                ShoppingListTextRenderer,
+                ShoppingListCSVRenderer,
+                ShoppingListJSONRenderer,
+            ])
     def download_shopping_cart(self, request):
-        return recipe_pdf_download(request)
+        renderer = request.accepted_renderer
+        if renderer.format == PDFRenderer.format:
+            if (
+                request.method == 'POST'
+                and Cart.objects.filter(user=request.user).count()
+                >= SHOPPING_LIST_ASYNC_THRESHOLD
+            ):
+                return self.enqueue_export(request)
+            response = recipe_pdf_download(request)
+        else:
+            response = StreamingHttpResponse(
+                renderer.stream(iter_shopping_list(request.user)),
+                content_type=f'{renderer.media_type}; '
+                             f'charset={renderer.charset}',
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def enqueue_export(self, request):
+        """Постановка PDF большого списка покупок в очередь exportworker."""
+        job = ShoppingListExport.objects.filter(
+            user=request.user, status=ShoppingListExport.PENDING,
+        ).first()
+        if job is None:
+            job = ShoppingListExport.objects.create(user=request.user)
+        request.accepted_renderer = JSONRenderer()
+        request.accepted_media_type = JSONRenderer.media_type
+        return Response(
+            ShoppingListExportSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=False, methods=['get'],
+        url_path=r'download_shopping_cart/(?P<export_id>\d+)',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_list_export(self, request, export_id=None):
+        job = get_object_or_404(
+            ShoppingListExport, pk=export_id, user=request.user,
+        )
+        if job.status == ShoppingListExport.DONE:
+            return FileResponse(
+                job.file.open('rb'),
+                as_attachment=True, filename='shopping_list.pdf',
+            )
+        return Response(
+            ShoppingListExportSerializer(job).data,
+            status=(
+                status.HTTP_200_OK
+                if job.status == ShoppingListExport.FAILED
+                else status.HTTP_202_ACCEPTED
+            ),
+        )
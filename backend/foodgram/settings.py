@@ -102,6 +102,17 @@ DATABASES = {
 # }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -178,6 +189,16 @@ TAG_MAX_LENGTH = 7
 EMPTY = '---пусто---'
 MIN_INGREDIENT_VALUE = 1
 MAX_INGREDIENT_VALUE = 1000
+COUNT_CACHE_TIMEOUT = 30
+COUNT_ESTIMATE_THRESHOLD = 10000
+RECIPE_CACHE_TIMEOUT = 60 * 60
+CATALOG_CHECK_INTERVAL = 5
+SEARCH_CONFIG = 'russian'
+SHOPPING_LIST_CACHE_SIZE = 100 * 1024 * 1024
+SHOPPING_LIST_ASYNC_THRESHOLD = 30
+SHOPPING_LIST_EXPORT_TTL = 24 * 60 * 60
+SHOPPING_LIST_EXPORT_TIMEOUT = 10 * 60
+SHOPPING_LIST_EXPORT_ATTEMPTS = 3
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
@@ -185,4 +206,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы, которые отдаются только через API, вне MEDIA_ROOT.
+PRIVATE_ROOT = os.getenv(
+    'PRIVATE_ROOT', default=os.path.join(BASE_DIR, 'private'))
+SHOPPING_LIST_CACHE_DIR = os.path.join(PRIVATE_ROOT, 'shopping_lists')
+SHOPPING_LIST_EXPORT_DIR = os.path.join(PRIVATE_ROOT, 'exports')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,14 @@
+import os
+
+from foodgram.settings import *  # noqa: F401, F403
+
+SECRET_KEY = 'test'
+
+# Тесты идут на SQLite в памяти, если база не задана явно через DB_ENGINE.
+if 'DB_ENGINE' not in os.environ:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+    }
@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 
 from foodgram.settings import EMPTY
 
-from .models import Favorite, Ingredient, Recipe, Cart, Tag
+from .models import Favorite, Ingredient, Recipe, Cart, ShoppingTotal, Tag
 
 
 class RecipeIngredList(admin.TabularInline):
@@ -43,6 +43,13 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredList,)
     empty = EMPTY
 
+    def save_related(self, request, form, formsets, change):
+        ShoppingTotal.lock_recipe(form.instance.pk)
+        old_amounts = ShoppingTotal.get_recipe_amounts(form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        form.instance.update_ingredients_count()
+        ShoppingTotal.update_recipe(form.instance.pk, old_amounts)
+
     def is_in_favorited(self, instance):
         return instance.favorites.count()
 
@@ -4,7 +4,7 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from recipes.models import Ingredient
+from recipes.models import Ingredient, Version
 
 
 def get_reader(file_name: str):
@@ -23,6 +23,7 @@ class Command(BaseCommand):
         try:
             csv_reader = get_reader('ingredients.csv')
             rows = list(csv_reader)
+            units = {}
             for i, row in enumerate(rows, start=1):
                 if len(row) != 2:
                     self.stderr.write(
@@ -34,12 +35,25 @@ class Command(BaseCommand):
 
                 name = row[0]
                 measurement_unit = row[1]
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name,
-                )
-                ingredient.measurement_unit = measurement_unit
-                ingredient.save()
+                units[name] = measurement_unit
+
+            for ingredient in Ingredient.objects.all():
+                measurement_unit = units.pop(ingredient.name, None)
+                if (
+                    measurement_unit is not None
+                    and ingredient.measurement_unit != measurement_unit
+                ):
+                    ingredient.measurement_unit = measurement_unit
+                    ingredient.save(update_fields=('measurement_unit',))
 
+            # bulk_create не отправляет сигналы: справочник сбрасывается
+            # один раз на всю загрузку.
+            if units:
+                Ingredient.objects.bulk_create(
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in units.items()
+                )
+                Version.bump('ingredients')
             self.stdout.write(self.style.SUCCESS('Загрузка данных завершена.'))
         except (FileNotFoundError, PermissionError) as e:
             self.stderr.write(
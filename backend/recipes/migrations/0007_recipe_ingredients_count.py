@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 21:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredients_count(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredientsMerge = apps.get_model(
+        'recipes', 'RecipeIngredientsMerge',
+    )
+    Recipe.objects.update(
+        ingredients_count=Coalesce(
+            Subquery(
+                RecipeIngredientsMerge.objects.filter(
+                    recipe=OuterRef('pk'),
+                ).values('recipe').annotate(
+                    count=Count('id'),
+                ).values('count')[:1],
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_alter_recipeingredientsmerge_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ингредиентов'),
+        ),
+        migrations.RunPython(
+            fill_ingredients_count, migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('ingredients_count__gt', 0)), fields=['-pub_date'], name='recipe_listed_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-18 21:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_ingredients_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_listed_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('ingredients_count__gt', 0)), fields=['-pub_date', '-id'], name='recipe_listed_pub_date_id_idx'),
+        ),
+    ]
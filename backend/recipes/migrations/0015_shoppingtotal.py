@@ -0,0 +1,56 @@
+# Generated by Django 3.2 on 2026-10-18 22:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_totals(apps, schema_editor):
+    RecipeIngredientsMerge = apps.get_model(
+        'recipes', 'RecipeIngredientsMerge',
+    )
+    ShoppingTotal = apps.get_model('recipes', 'ShoppingTotal')
+    ShoppingTotal.objects.bulk_create(
+        ShoppingTotal(
+            user_id=row['recipe__shopping__user'],
+            ingredient_id=row['ingredient'],
+            amount=row['total'],
+        )
+        for row in RecipeIngredientsMerge.objects.filter(
+            recipe__shopping__isnull=False,
+        ).values('recipe__shopping__user', 'ingredient').annotate(
+            total=Sum('amount'),
+        ).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0014_shoppinglistexport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingtotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_totals, migrations.RunPython.noop,
+        ),
+    ]
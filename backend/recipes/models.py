@@ -1,10 +1,21 @@
+from datetime import timedelta
+from uuid import uuid4
+
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import FileSystemStorage
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
 
 from foodgram.settings import (INGREDIENT_MAX_LENGTH,
                                RECIPE_NAME_MAX_LENGTH,
-                               TAG_MAX_LENGTH, MIN_INGREDIENT_VALUE)
+                               TAG_MAX_LENGTH, MIN_INGREDIENT_VALUE,
+                               SHOPPING_LIST_EXPORT_ATTEMPTS,
+                               SHOPPING_LIST_EXPORT_DIR,
+                               SHOPPING_LIST_EXPORT_TIMEOUT,
+                               SHOPPING_LIST_EXPORT_TTL)
 
 from users.models import User
 
@@ -24,10 +35,34 @@ class Ingredient(models.Model):
                 fields=['name', 'measurement_unit'], name='unique_ingredient',
             ),
         ]
+        indexes = [
+            models.Index(Lower('name'), name='ingredient_lower_name_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.saved_values = instance.get_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.saved_values = self.get_values()
+
+    def get_values(self):
+        return {
+            field: self.__dict__[field]
+            for field in ('name', 'measurement_unit')
+            if field in self.__dict__
+        }
+
+    def has_changed(self):
+        """Изменились ли название или единица с момента загрузки из БД."""
+        return getattr(self, 'saved_values', None) != self.get_values()
+
 
 filtered_ingredients = Ingredient.objects.filter(
     name__icontains='название инградиента',
@@ -97,25 +132,74 @@ class Recipe(models.Model):
         auto_now_add=True,
     )
 
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Тег',
     )
 
+    ingredients_count = models.PositiveIntegerField(
+        verbose_name='Количество ингредиентов',
+        default=0,
+        editable=False,
+    )
+
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         constraints = [
             models.UniqueConstraint(
                 fields=['author', 'name'],
                 name='unique_recipe_author_name',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_listed_pub_date_id_idx',
+                condition=models.Q(ingredients_count__gt=0),
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.author})'
 
+    def update_ingredients_count(self):
+        """Пересчет сохраненного количества ингредиентов рецепта."""
+        self.ingredients_count = self.recipe_ingredients.count()
+        self.save(update_fields=('ingredients_count',))
+
+    @classmethod
+    def update_ingredients_counts(cls, recipe_ids):
+        """Пересчет количества ингредиентов рецептов одним UPDATE."""
+        cls.objects.filter(pk__in=recipe_ids).update(
+            ingredients_count=Coalesce(
+                models.Subquery(
+                    RecipeIngredientsMerge.objects.filter(
+                        recipe=models.OuterRef('pk'),
+                    ).order_by().values('recipe').annotate(
+                        count=models.Count('pk'),
+                    ).values('count'),
+                ),
+                0,
+            ),
+        )
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -140,6 +224,11 @@ class Favorite(models.Model):
                 name='is_favorited',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} выбран {self.user.username}'
@@ -176,6 +265,12 @@ class RecipeIngredientsMerge(models.Model):
                 name='unique_recipe_ingredient_merge',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='ingredient_recipe_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'Ингредиент: {self.ingredient}, Рецепт: {self.recipe}'
@@ -203,6 +298,247 @@ class Cart(models.Model):
                 fields=('user', 'recipe'), name='unique_cart_user_recipe',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'), name='cart_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} в списке покупок для {self.user.username}'
+
+
+class Version(models.Model):
+    """
+    Счетчик версий данных: справочников тегов и ингредиентов
+    и пользовательских отметок (избранное, покупки, подписки).
+    Используется для условных GET-запросов и сброса кэшей.
+    """
+    key = models.CharField(
+        'Ключ', max_length=INGREDIENT_MAX_LENGTH, unique=True,
+    )
+    value = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+    @classmethod
+    def bump(cls, key):
+        version, created = cls.objects.get_or_create(
+            key=key, defaults={'value': 1},
+        )
+        if not created:
+            cls.objects.filter(pk=version.pk).update(
+                value=models.F('value') + 1, updated_at=timezone.now(),
+            )
+
+    @classmethod
+    def get_many(cls, *keys):
+        return {
+            version.key: version
+            for version in cls.objects.filter(key__in=keys)
+        }
+
+
+export_storage = FileSystemStorage(location=SHOPPING_LIST_EXPORT_DIR)
+
+
+def get_export_storage():
+    """Хранилище выгрузок вне MEDIA_ROOT: файлы отдаются только через API."""
+    return export_storage
+
+
+def export_upload_to(instance, filename):
+    return f'{uuid4().hex}.pdf'
+
+
+class ShoppingListExport(models.Model):
+    """Задание на фоновое формирование PDF списка покупок."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Формируется'),
+        (DONE, 'Готов'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_exports',
+        verbose_name='Пользователь',
+    )
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING,
+    )
+    file = models.FileField(
+        'Файл', upload_to=export_upload_to, storage=get_export_storage,
+        blank=True,
+    )
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    started = models.DateTimeField('Начало формирования', null=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='export_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.get_status_display()}'
+
+    @classmethod
+    def claim_next(cls):
+        """
+        Взятие первого задания из очереди. Задание, которое формируется
+        дольше SHOPPING_LIST_EXPORT_TIMEOUT, считается брошенным упавшим
+        воркером и берется повторно. Условный UPDATE по статусу и времени
+        начала не дает двум воркерам взять одно задание.
+        """
+        stale = timezone.now() - timedelta(
+            seconds=SHOPPING_LIST_EXPORT_TIMEOUT,
+        )
+        cls.objects.filter(
+            status=cls.RUNNING, started__lt=stale,
+            attempts__gte=SHOPPING_LIST_EXPORT_ATTEMPTS,
+        ).update(status=cls.FAILED)
+        for job in cls.objects.filter(
+            models.Q(status=cls.PENDING)
+            | models.Q(status=cls.RUNNING, started__lt=stale)
+        )[:10]:
+            started = timezone.now()
+            if cls.objects.filter(
+                pk=job.pk, status=job.status, started=job.started,
+            ).update(
+                status=cls.RUNNING, started=started,
+                attempts=models.F('attempts') + 1,
+            ):
+                job.status = cls.RUNNING
+                job.started = started
+                job.attempts += 1
+                return job
+        return None
+
+    @classmethod
+    def delete_expired(cls):
+        """Удаление завершенных выгрузок старше SHOPPING_LIST_EXPORT_TTL."""
+        return cls.objects.filter(
+            status__in=(cls.DONE, cls.FAILED),
+            created__lt=timezone.now() - timedelta(
+                seconds=SHOPPING_LIST_EXPORT_TTL,
+            ),
+        ).delete()[0]
+
+
+class ShoppingTotal(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении списка покупок и ингредиентов
+    рецептов из него; пересобирается командой shoppingtotals.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_total',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
+
+    @staticmethod
+    def lock_recipe(recipe_id):
+        """
+        Блокировка строки рецепта до конца транзакции. Изменение его
+        ингредиентов и добавление или удаление его в списках покупок
+        читают количества и пользователей списков по очереди.
+        """
+        list(Recipe.objects.select_for_update().filter(
+            pk=recipe_id,
+        ).values_list('pk', flat=True))
+
+    @staticmethod
+    def get_recipe_amounts(recipe_id):
+        return dict(RecipeIngredientsMerge.objects.filter(
+            recipe_id=recipe_id,
+        ).values_list('ingredient_id', 'amount'))
+
+    @classmethod
+    def add(cls, user_ids, amounts, sign=1):
+        """Изменение итогов пользователей на amounts: {id ингредиента: ...}."""
+        amounts = {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in amounts.items()
+            if amount
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            # Недостающие строки создаются с нулем: select_for_update
+            # не блокирует отсутствующие строки, а вставка с
+            # ignore_conflicts не падает на параллельно вставленной.
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=user_id, ingredient_id=ingredient_id, amount=0)
+                    for user_id in user_ids
+                    for ingredient_id, amount in amounts.items()
+                    if amount > 0
+                ],
+                ignore_conflicts=True,
+            )
+            changed, removed = [], []
+            for total in cls.objects.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=amounts,
+            ).order_by('pk'):
+                total.amount += amounts[total.ingredient_id]
+                if total.amount > 0:
+                    changed.append(total)
+                else:
+                    removed.append(total.pk)
+            cls.objects.bulk_update(changed, ('amount',))
+            cls.objects.filter(pk__in=removed).delete()
+
+    @classmethod
+    def update_recipe(cls, recipe_id, old_amounts):
+        """Перенос изменения ингредиентов рецепта в итоги его списков."""
+        new_amounts = cls.get_recipe_amounts(recipe_id)
+        cls.add(
+            list(Cart.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id', flat=True,
+            )),
+            {
+                ingredient_id: (
+                    new_amounts.get(ingredient_id, 0)
+                    - old_amounts.get(ingredient_id, 0)
+                )
+                for ingredient_id in {*old_amounts, *new_amounts}
+            },
+        )
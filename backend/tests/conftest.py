@@ -0,0 +1,112 @@
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from rest_framework.test import APIClient
+
+from api.cache import ingredient_catalog, shopping_list_files, tag_catalog
+from recipes.models import Ingredient, Recipe, RecipeIngredientsMerge, Tag
+from users.models import Follow
+
+UNITS = ('г', 'кг', 'шт', 'мл')
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(settings, tmp_path, monkeypatch):
+    """Файлы и кэши каждого теста не видны другим тестам."""
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    monkeypatch.setattr(
+        shopping_list_files, 'directory', str(tmp_path / 'shopping_lists'),
+    )
+    cache.clear()
+    for catalog in (tag_catalog, ingredient_catalog):
+        catalog.snapshot = None
+        catalog.invalidate()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='user@foodgram.ru', username='user', password='password',
+        first_name='Иван', last_name='Иванов',
+    )
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        email='author@foodgram.ru', username='author', password='password',
+        first_name='Петр', last_name='Петров',
+    )
+
+
+@pytest.fixture
+def authors(django_user_model):
+    return [
+        django_user_model.objects.create_user(
+            email=f'author{i}@foodgram.ru', username=f'author{i}',
+            password='password', first_name='Автор', last_name=f'{i}',
+        )
+        for i in range(10)
+    ]
+
+
+@pytest.fixture
+def followed(user, authors):
+    Follow.objects.bulk_create(
+        Follow(follower=user, author=author) for author in authors[::2]
+    )
+    return {author.pk for author in authors[::2]}
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [
+        Tag.objects.create(name=f'Тег {i}', color='#E26C2D', slug=f'tag{i}')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {i}', measurement_unit=UNITS[i % len(UNITS)],
+        )
+        for i in range(10)
+    ]
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    """Создание рецептов с тегами, тремя ингредиентами и картинкой."""
+    def make_recipes(count, author=author):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe(
+                author=author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10,
+            )
+            recipe.image.save(
+                f'recipe{i}.png', ContentFile(b'image'), save=False,
+            )
+            recipe.save()
+            recipe.tags.set(tags[:1 + i % len(tags)])
+            RecipeIngredientsMerge.objects.bulk_create(
+                RecipeIngredientsMerge(
+                    recipe=recipe,
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=10 * (j + 1),
+                )
+                for j in range(3)
+            )
+            recipe.update_ingredients_count()
+            recipes.append(recipe)
+        return recipes
+    return make_recipes
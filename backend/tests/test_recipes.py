@@ -0,0 +1,143 @@
+from time import monotonic
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.cache import tag_catalog
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow
+
+RECIPES_URL = '/api/recipes/'
+LIST_QUERIES = 9
+ANONYMOUS_LIST_QUERIES = 8
+DETAIL_QUERIES = 8
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [6, 100])
+def test_recipe_list_viewer_flags_query_count(
+    user, user_client, make_recipes, django_assert_num_queries, page_size,
+):
+    recipes = make_recipes(100)
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2]
+    )
+    Cart.objects.bulk_create(
+        Cart(user=user, recipe=recipe) for recipe in recipes[::3]
+    )
+    favorited = {recipe.pk for recipe in recipes[::2]}
+    in_cart = {recipe.pk for recipe in recipes[::3]}
+
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get(RECIPES_URL, {'limit': page_size})
+
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == page_size
+    for recipe in results:
+        assert recipe['is_favorited'] == (recipe['id'] in favorited)
+        assert recipe['is_in_shopping_cart'] == (recipe['id'] in in_cart)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [6, 100])
+def test_recipe_list_query_count(
+    make_recipes, django_assert_num_queries, page_size,
+):
+    make_recipes(100)
+
+    with django_assert_num_queries(ANONYMOUS_LIST_QUERIES):
+        response = APIClient().get(RECIPES_URL, {'limit': page_size})
+
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == page_size
+    for recipe in results:
+        assert recipe['tags']
+        assert len(recipe['ingredients']) == 3
+        assert recipe['author']['username'] == 'author'
+
+
+@pytest.mark.django_db
+def test_recipe_detail_query_count(
+    user, author, user_client, make_recipes, django_assert_num_queries,
+):
+    recipe, = make_recipes(1)
+    Follow.objects.create(follower=user, author=author)
+
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = user_client.get(f'{RECIPES_URL}{recipe.pk}/')
+
+    assert response.status_code == 200
+    assert response.data['author']['is_subscribed'] is True
+    assert [tag['slug'] for tag in response.data['tags']] == ['tag0']
+    assert len(response.data['ingredients']) == 3
+
+
+@pytest.mark.django_db
+def test_recipe_list_shows_renamed_tag(tags, make_recipes):
+    make_recipes(1)
+    client = APIClient()
+    etag = client.get(RECIPES_URL)['ETag']
+    stale_snapshot = tag_catalog.snapshot
+
+    tag = tags[0]
+    tag.name = 'Новое название'
+    tag.save()
+    # Воркер, который еще не перепроверял версию справочника тегов.
+    tag_catalog.snapshot = stale_snapshot
+    tag_catalog.checked_at = monotonic()
+    response = client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response.data['results'][0]['tags'][0]['name'] == 'Новое название'
+
+
+@pytest.mark.django_db
+def test_ingredient_delete_recounts_recipe_ingredients(
+    ingredients, make_recipes,
+):
+    first, second = make_recipes(2)
+    client = APIClient()
+    assert client.get(RECIPES_URL).data['count'] == 2
+
+    ingredients[0].delete()
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.ingredients_count, second.ingredients_count) == (2, 3)
+
+    for ingredient in ingredients[1:3]:
+        ingredient.delete()
+    first.refresh_from_db()
+    assert first.ingredients_count == 0
+    response = client.get(RECIPES_URL)
+    assert [recipe['id'] for recipe in response.data['results']] == [
+        second.pk,
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [6, 100])
+def test_recipe_list_is_subscribed_query_count(
+    user_client, authors, followed, make_recipes,
+    django_assert_num_queries, page_size,
+):
+    for i, recipe in enumerate(make_recipes(100)):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            author=authors[i % len(authors)],
+        )
+
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get(RECIPES_URL, {'limit': page_size})
+
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == page_size
+    for recipe in results:
+        assert recipe['author']['is_subscribed'] == (
+            recipe['author']['id'] in followed
+        )
+    assert {recipe['author']['is_subscribed'] for recipe in results} == {
+        True, False,
+    }
@@ -0,0 +1,54 @@
+import pytest
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.representations import RecipeRepresentationBuilder
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+from recipes.models import Cart, Favorite
+from users.models import Follow
+
+
+@pytest.mark.django_db
+def test_builder_matches_serializer(
+    user, author, django_user_model, make_recipes,
+):
+    other_author = django_user_model.objects.create_user(
+        email='other@foodgram.ru', username='other', password='password',
+        first_name='Сидор', last_name='Сидоров',
+    )
+    recipes = make_recipes(4) + make_recipes(4, author=other_author)
+    Follow.objects.create(follower=user, author=author)
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2]
+    )
+    Cart.objects.bulk_create(
+        Cart(user=user, recipe=recipe) for recipe in recipes[::3]
+    )
+    request = Request(
+        APIRequestFactory().get('/api/recipes/', HTTP_HOST='testserver'),
+    )
+    request.user = user
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+    serializer = RecipeSerializer(context={'request': request})
+
+    expected = [
+        serializer.to_representation(recipe)
+        for recipe in view.get_queryset()
+    ]
+    built = RecipeRepresentationBuilder(request).build_many(
+        list(view.get_read_queryset()),
+    )
+
+    assert JSONRenderer().render(built) == JSONRenderer().render(expected)
+    assert {len(recipe['tags']) for recipe in built} == {1, 2, 3}
+    assert {len(recipe['ingredients']) for recipe in built} == {3}
+    assert all(recipe['image'] for recipe in built)
+    assert {
+        (recipe['is_favorited'], recipe['is_in_shopping_cart'])
+        for recipe in built
+    } == {(True, True), (True, False), (False, True), (False, False)}
+    assert {
+        recipe['author']['is_subscribed'] for recipe in built
+    } == {True, False}
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+import reportlab
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from api import recipepdf
+from recipes.models import (Cart, Ingredient, Recipe, RecipeIngredientsMerge,
+                            ShoppingTotal)
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.fixture(autouse=True)
+def pdf_font(monkeypatch):
+    """Шрифт robotor кладется в static при деплое; в тестах берем Vera."""
+    if not os.path.exists(recipepdf.FONT_PATH):
+        monkeypatch.setattr(recipepdf, 'FONT_PATH', os.path.join(
+            os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf',
+        ))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cart_size', [1, 30])
+@pytest.mark.parametrize('file_format, queries, content_type', [
+    ('txt', 1, 'text/plain; charset=utf-8'),
+    ('pdf', 4, 'application/pdf'),
+])
+def test_download_shopping_cart_query_count(
+    user, user_client, make_recipes, django_assert_num_queries,
+    cart_size, file_format, queries, content_type,
+):
+    recipes = make_recipes(30)
+    for recipe in recipes[:cart_size]:
+        Cart.objects.create(user=user, recipe=recipe)
+
+    with django_assert_num_queries(queries):
+        response = user_client.get(DOWNLOAD_URL, {'format': file_format})
+        content = b''.join(response.streaming_content)
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == content_type
+    if file_format == 'txt':
+        assert 'Ингредиент 0' in content.decode()
+    else:
+        assert content.startswith(b'%PDF')
+
+
+@pytest.mark.django_db
+def test_shopping_totals_follow_cart_and_recipe_deletion(
+    user, author, django_user_model, make_recipes,
+):
+    reader = django_user_model.objects.create_user(
+        email='reader@foodgram.ru', username='reader', password='password',
+        first_name='Читатель', last_name='Читателев',
+    )
+    recipes = make_recipes(5)
+    for recipe in recipes:
+        Cart.objects.create(user=user, recipe=recipe)
+        Cart.objects.create(user=reader, recipe=recipe)
+
+    Cart.objects.filter(user=user, recipe=recipes[0]).delete()
+    recipes[1].delete()
+    call_command('shoppingtotals', verify=True)
+
+    author.delete()
+    assert not ShoppingTotal.objects.exists()
+
+
+@pytest.mark.django_db
+def test_shopping_totals_follow_recipe_ingredient_update(
+    user, author, tags, ingredients, make_recipes,
+):
+    recipe, = make_recipes(1)
+    Cart.objects.create(user=user, recipe=recipe)
+    Cart.objects.create(user=author, recipe=recipe)
+    client = APIClient()
+    client.force_authenticate(author)
+
+    response = client.patch(f'/api/recipes/{recipe.pk}/', {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': [tags[0].pk],
+        'ingredients': [
+            {'id': ingredients[0].pk, 'amount': 500},
+            {'id': ingredients[5].pk, 'amount': 7},
+        ],
+    }, format='json')
+
+    assert response.status_code == 200
+    call_command('shoppingtotals', verify=True)
+    assert dict(ShoppingTotal.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount',
+    )) == {ingredients[0].pk: 500, ingredients[5].pk: 7}
+
+
+UNIT_TOTALS = [
+    ('молоко', 1.3, 'л'),
+    ('мука', 3.5, 'кг'),
+    ('соль', 1, 'щепотка'),
+    ('яйца', 5, 'штук'),
+]
+
+
+@pytest.fixture
+def unit_cart(user, author):
+    """Один продукт в разных единицах одного семейства в трех рецептах."""
+    recipes = (
+        {('мука', 'г'): 800, ('молоко', 'мл'): 300, ('яйца', 'шт'): 2,
+         ('соль', 'щепотка'): 1},
+        {('мука', 'г'): 700, ('молоко', 'л'): 1, ('яйца', 'шт.'): 3},
+        {('мука', 'кг'): 2},
+    )
+    for i, amounts in enumerate(recipes):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {i}', text='Описание',
+            cooking_time=10, image='recipes/image.png',
+        )
+        RecipeIngredientsMerge.objects.bulk_create(
+            RecipeIngredientsMerge(
+                recipe=recipe,
+                ingredient=Ingredient.objects.get_or_create(
+                    name=name, measurement_unit=unit,
+                )[0],
+                amount=amount,
+            )
+            for (name, unit), amount in amounts.items()
+        )
+        recipe.update_ingredients_count()
+        Cart.objects.create(user=user, recipe=recipe)
+
+
+def parse_txt(content):
+    return [
+        line.split('. ', 1)[1]
+        for line in content.decode().splitlines()[2:]
+    ]
+
+
+def parse_csv(content):
+    rows = list(csv.reader(io.StringIO(content.decode())))[1:]
+    return [f'{name} – {amount} {unit}' for name, amount, unit in rows]
+
+
+def parse_json(content):
+    return [
+        f'{row["name"]} – {row["amount"]} {row["measurement_unit"]}'
+        for row in json.loads(content)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('file_format, parse', [
+    ('txt', parse_txt), ('csv', parse_csv), ('json', parse_json),
+])
+def test_shopping_list_normalizes_units(
+    user_client, unit_cart, file_format, parse,
+):
+    response = user_client.get(DOWNLOAD_URL, {'format': file_format})
+
+    assert response.status_code == 200
+    assert parse(b''.join(response.streaming_content)) == [
+        f'{name} – {amount} {unit}' for name, amount, unit in UNIT_TOTALS
+    ]
+
+
+@pytest.mark.django_db
+def test_pdf_shopping_list_normalizes_units(
+    user_client, unit_cart, monkeypatch,
+):
+    lines = []
+    draw_line = recipepdf.ShoppingListLayout.draw_line
+
+    def record_line(layout, text, *args):
+        lines.append(text)
+        return draw_line(layout, text, *args)
+
+    monkeypatch.setattr(
+        recipepdf.ShoppingListLayout, 'draw_line', record_line,
+    )
+    response = user_client.get(DOWNLOAD_URL, {'format': 'pdf'})
+
+    assert response.status_code == 200
+    assert lines[-len(UNIT_TOTALS):] == [
+        f'{i}. {name} – {amount} {unit}'
+        for i, (name, amount, unit) in enumerate(UNIT_TOTALS, start=1)
+    ]
@@ -0,0 +1,29 @@
+import pytest
+
+USERS_URL = '/api/users/'
+USER_LIST_QUERIES = 3
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [6, 100])
+def test_user_list_is_subscribed_query_count(
+    user_client, django_user_model, followed, django_assert_num_queries,
+    page_size,
+):
+    django_user_model.objects.bulk_create(
+        django_user_model(
+            email=f'reader{i}@foodgram.ru', username=f'reader{i}',
+            first_name='Читатель', last_name=f'{i}',
+        )
+        for i in range(100)
+    )
+
+    with django_assert_num_queries(USER_LIST_QUERIES):
+        response = user_client.get(USERS_URL, {'limit': page_size})
+
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == page_size
+    for user in results:
+        assert user['is_subscribed'] == (user['id'] in followed)
+    assert any(user['is_subscribed'] for user in results)
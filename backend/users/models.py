@@ -104,6 +104,12 @@ class Follow(models.Model):
             models.CheckConstraint(check=~Q(follower=F('author')),
                                    name='self_follow'),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'follower'],
+                name='follow_author_follower_idx',
+            ),
+        ]
 
     def __str__(self):
         return (
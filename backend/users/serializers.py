@@ -6,9 +6,24 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 
 from .models import Follow, User
+from foodgram.settings import RECIPES_LIMIT
 from recipes.models import Recipe
 
 
+def get_followed_author_ids(request):
+    """
+    Id авторов, на которых подписан пользователь запроса. Загружаются
+    одним запросом и хранятся в request на время ответа.
+    """
+    followed = getattr(request, 'followed_author_ids', None)
+    if followed is None:
+        followed = set(Follow.objects.filter(
+            follower=request.user,
+        ).values_list('author_id', flat=True))
+        request.followed_author_ids = followed
+    return followed
+
+
 class FieldUserSerializer(UserSerializer):
     """Сериализатор пользователя с дополнительным полем."""
     is_subscribed = SerializerMethodField(read_only=True)
@@ -30,18 +45,15 @@ class FieldUserSerializer(UserSerializer):
         request = self.context.get('request')
         if request is None:
             return False
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        if request.user.is_anonymous:
             return False
-        return Follow.objects.filter(follower=user, author=obj).exists()
+        return obj.pk in get_followed_author_ids(request)
 
 
 class GetFollowSerializer(FieldUserSerializer):
     """Сериализатора подписчика."""
     recipes = SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True,
-    )
+    recipes_count = SerializerMethodField()
     is_subscribed = serializers.BooleanField(default=True)
 
     class Meta:
@@ -63,8 +75,17 @@ class GetFollowSerializer(FieldUserSerializer):
             'last_name',
         )
 
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
+
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :self.context.get('recipes_limit', RECIPES_LIMIT)
+            ]
         serializer = RecipeFollowSerializer(
             recipes, many=True, context=self.context,
         )
@@ -80,9 +101,6 @@ class RecipeFollowSerializer(serializers.ModelSerializer):
 
 
 class AddFollowerSerializer(GetFollowSerializer):
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-
     def validate(self, data):
         author = self.instance
         user = self.context.get('request').user
@@ -100,16 +118,6 @@ class AddFollowerSerializer(GetFollowSerializer):
 
         return data
 
-    def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        serializer = RecipeFollowSerializer(
-            recipes, many=True, context=self.context,
-        )
-        return serializer.data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
     class Meta(GetFollowSerializer.Meta):
         fields = GetFollowSerializer.Meta.fields + ('recipes_count', 'recipes')
         read_only_fields = (
@@ -1,19 +1,60 @@
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from django.db.models import Count
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL
 from rest_framework import permissions, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from api.pagination import CustomPagination
+from recipes.models import Recipe
 from .models import Follow, User
 from .serializers import (
     AddFollowerSerializer, FieldUserSerializer, GetFollowSerializer)
 from foodgram.settings import RECIPES_LIMIT
 
 
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return RECIPES_LIMIT
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise ValidationError(
+            {'recipes_limit': 'Должно быть целым неотрицательным числом.'},
+        )
+    return limit
+
+
+def get_latest_recipes_prefetch(author_ids, limit):
+    """
+    Последние limit рецептов каждого автора одним запросом:
+    номер рецепта у автора считается оконной функцией ROW_NUMBER.
+    """
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    ranked = (
+        f'SELECT id FROM ('
+        f'SELECT id, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM "{Recipe._meta.db_table}" '
+        f'WHERE author_id IN ({placeholders})'
+        f') AS ranked WHERE position <= %s'
+    )
+    return Prefetch(
+        'recipes',
+        queryset=Recipe.objects.filter(
+            pk__in=RawSQL(ranked, (*author_ids, limit)),
+        ).only('id', 'name', 'image', 'cooking_time', 'author_id'),
+        to_attr='latest_recipes',
+    )
+
+
 class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = FieldUserSerializer
@@ -29,14 +70,20 @@ class UsersViewSet(UserViewSet):
     def subscribe(self, request, **kwargs):
         user = request.user
         author_id = int(kwargs.get('id'))
-        author = get_object_or_404(User, id=author_id)
+        author = get_object_or_404(
+            User.objects.annotate(recipes_count=Count('recipes')),
+            id=author_id,
+        )
         subscription = Follow.objects.filter(follower=user, author=author)
 
         if request.method == 'POST':
             serializer = AddFollowerSerializer(
                 instance=author,
                 data=request.data,
-                context={'request': request},
+                context={
+                    'request': request,
+                    'recipes_limit': get_recipes_limit(request),
+                },
             )
             serializer.is_valid(raise_exception=True)
 
@@ -64,24 +111,20 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         user = request.user
         queryset = User.objects.filter(followers__follower=user).annotate(
-            recipe_count=Count('recipes'),
+            recipes_count=Count('recipes'),
         )
 
+        recipes_limit = get_recipes_limit(request)
+
         pages = self.paginate_queryset(queryset)
+        if pages:
+            prefetch_related_objects(pages, get_latest_recipes_prefetch(
+                [author.pk for author in pages], recipes_limit,
+            ))
 
         serializer = GetFollowSerializer(
             pages,
             many=True,
-            context={'request': request},
+            context={'request': request, 'recipes_limit': recipes_limit},
         )
-
-        serialized_data = []
-        for data in serializer.data:
-            user_data = data.copy()
-            if 'recipes' in user_data:
-                recipes = user_data['recipes']
-                if len(recipes) > RECIPES_LIMIT:
-                    user_data['recipes'] = recipes[:RECIPES_LIMIT]
-            serialized_data.append(user_data)
-
-        return self.get_paginated_response(serialized_data)
+        return self.get_paginated_response(serializer.data)